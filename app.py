@@ -3,10 +3,16 @@ import os
 from pathlib import Path
 import time
 import tempfile
+import chromadb
 
 # Import our custom modules
 from ocr_utils import extract_text_from_pdf_ocr, sanitize_collection_name
-from vector_store import initialize_embeddings, connect_to_chroma, initialize_or_update_vector_store
+from vector_store import (
+    initialize_embeddings,
+    connect_to_chroma,
+    initialize_or_update_vector_store,
+    list_collection_names
+)
 from rag_pipeline import setup_rag_pipeline, ask_question
 
 # Page configuration
@@ -57,6 +63,16 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Cached resources: Streamlit reruns this script on every interaction, so
+# the embedding model and Chroma client are created once per process
+@st.cache_resource(show_spinner=False)
+def get_embeddings():
+    return initialize_embeddings()
+
+@st.cache_resource(show_spinner=False)
+def get_chroma_client(persist_dir: str):
+    return chromadb.PersistentClient(path=persist_dir)
+
 # Session state initialization
 if 'persist_dir' not in st.session_state:
     st.session_state.persist_dir = tempfile.mkdtemp()
@@ -110,13 +126,17 @@ with st.sidebar:
     # Initialize embeddings and chromadb client
     if st.button("Initialize System"):
         with st.spinner("Initializing embeddings and database connection..."):
-            st.session_state.embeddings = initialize_embeddings()
-            st.session_state.client, collections = connect_to_chroma(st.session_state.persist_dir)
+            st.session_state.embeddings = get_embeddings()
+            st.session_state.client, _ = connect_to_chroma(
+                st.session_state.persist_dir,
+                get_chroma_client(st.session_state.persist_dir)
+            )
             
+            # All chunks share one Chroma collection; list the names they are tagged with
+            collections = list_collection_names(st.session_state.client, st.session_state.persist_dir)
             if collections:
                 st.write(f"Found {len(collections)} existing collections:")
-                for col in collections:
-                    col_name = col if isinstance(col, str) else col.get("name")
+                for col_name in collections:
                     st.write(f"- {col_name}")
             
             if st.session_state.api_keys_set:
@@ -172,7 +192,10 @@ with tab1:
                 # Apply OCR if enabled
                 if use_ocr:
                     with st.spinner(f"Applying OCR to {uploaded_file.name}..."):
-                        extracted_text = extract_text_from_pdf_ocr(str(file_path))
+                        extracted_text = extract_text_from_pdf_ocr(
+                            str(file_path),
+                            cache_dir=os.path.join(st.session_state.persist_dir, "ocr_cache")
+                        )
                         st.write(f"Extracted {len(extracted_text.split())} words from {uploaded_file.name}")
                 
                 progress_bar.progress(progress)
@@ -183,7 +206,9 @@ with tab1:
                     initialize_or_update_vector_store(
                         st.session_state.persist_dir,
                         st.session_state.docs_path,
-                        st.session_state.collection_name
+                        st.session_state.collection_name,
+                        embeddings=st.session_state.embeddings,
+                        client=st.session_state.client
                     )
                     st.session_state.has_uploaded = True
                     st.success("Documents processed and added to vector store successfully!")
@@ -210,7 +235,8 @@ with tab2:
                         st.session_state.persist_dir,
                         st.session_state.embeddings,
                         search_query,
-                        k=topk
+                        k=topk,
+                        collection_name=st.session_state.collection_name
                     )
                     
                     if results:
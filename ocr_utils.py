@@ -1,40 +1,251 @@
 import os
 import re
-import hashlib
+import multiprocessing
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 import pytesseract
-from pdf2image import convert_from_path
+import xxhash
+from pdf2image import convert_from_path, pdfinfo_from_path
+import fitz  # PyMuPDF
 from langchain_core.documents import Document
 
+# Number of pages OCR'd concurrently; each worker drives its own Tesseract process
+OCR_MAX_WORKERS = int(os.environ.get("OCR_MAX_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+
+# OpenMP thread limit handed to Tesseract; an empty value keeps Tesseract's own threading
+OCR_OMP_THREAD_LIMIT = os.environ.get("OCR_OMP_THREAD_LIMIT", "1")
+
+# Pages whose embedded text layer has fewer characters than this are OCR'd
+OCR_MIN_TEXT_CHARS = int(os.environ.get("OCR_MIN_TEXT_CHARS", "25"))
+
+# Resolution pages are rendered at for OCR
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+
+# Concurrent OCR calls share one process-wide OMP_THREAD_LIMIT; it is set by
+# the first caller and removed by the last
+_omp_limit_lock = threading.Lock()
+_omp_limit_users = 0
+_omp_limit_owned = False
+
+# Number of hashes checked per Chroma `$in` lookup
+HASH_LOOKUP_BATCH_SIZE = 1000
+
+# Characters not allowed in Chroma collection names
+_COLLECTION_NAME_INVALID_RE = re.compile(r'[^a-zA-Z0-9_\-]')
+
 def sanitize_collection_name(name: str) -> str:
     """Sanitize a string to be used as a collection name in Chroma."""
     name = name.replace(" ", "_")
-    name = re.sub(r'[^a-zA-Z0-9_\-]', '', name)
+    name = _COLLECTION_NAME_INVALID_RE.sub('', name)
     return name[:63]
 
 def compute_hash(content: str) -> str:
-    """Compute SHA-256 hash of the document content."""
-    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+    """Compute the XXH3-128 content hash used to deduplicate document chunks."""
+    return xxhash.xxh3_128_hexdigest(content.encode("utf-8"))
+
+def compute_hashes(contents) -> list:
+    """Compute content hashes for many strings in a single pass."""
+    xxh3_128_hexdigest = xxhash.xxh3_128_hexdigest
+    return [xxh3_128_hexdigest(content.encode("utf-8")) for content in contents]
+
+def hash_key(content_hash: str) -> int:
+    """Compact a content hash into a 64-bit integer for membership checks."""
+    return int(content_hash[:16], 16)
+
+def is_new_hash(content_hash: str, seen_hashes: set) -> bool:
+    """Check whether a content hash is new, recording it in `seen_hashes`."""
+    key = hash_key(content_hash)
+    if key in seen_hashes:
+        return False
+    seen_hashes.add(key)
+    return True
+
+def compute_file_hash(file_path: str) -> str:
+    """Compute the XXH3-128 hash of a file's bytes, used as a cache key."""
+    digest = xxhash.xxh3_128()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    """Write `data` to `path` through a uniquely named temporary file and an atomic rename."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False)
+    try:
+        with f:
+            f.write(data)
+        os.replace(f.name, path)
+    except BaseException:
+        os.remove(f.name)
+        raise
+
+@contextmanager
+def _tesseract_thread_limit():
+    """Cap Tesseract's OpenMP threads while OCR runs, unless OMP_THREAD_LIMIT is already set."""
+    global _omp_limit_users, _omp_limit_owned
+    with _omp_limit_lock:
+        if _omp_limit_users == 0:
+            _omp_limit_owned = bool(OCR_OMP_THREAD_LIMIT) and "OMP_THREAD_LIMIT" not in os.environ
+            if _omp_limit_owned:
+                os.environ["OMP_THREAD_LIMIT"] = OCR_OMP_THREAD_LIMIT
+        _omp_limit_users += 1
+    try:
+        yield
+    finally:
+        with _omp_limit_lock:
+            _omp_limit_users -= 1
+            if _omp_limit_users == 0 and _omp_limit_owned:
+                os.environ.pop("OMP_THREAD_LIMIT", None)
+                _omp_limit_owned = False
+
+def _import_tesserocr():
+    """Import the optional tesserocr binding with the OCR thread limit applied."""
+    with _tesseract_thread_limit():
+        try:
+            # Optional: keeps one Tesseract engine loaded across pages
+            from tesserocr import PyTessBaseAPI
+        except ImportError:
+            return None
+    return PyTessBaseAPI
+
+# tesserocr's OpenMP runtime reads OMP_THREAD_LIMIT only when it is loaded
+PyTessBaseAPI = _import_tesserocr()
+
+def _extract_text_layer(pdf_path: str) -> list:
+    """Return the embedded text of every page, empty for pages without one."""
+    try:
+        with fitz.open(pdf_path) as pdf:
+            return [page.get_text("text") for page in pdf]
+    except Exception as e:
+        print(f"Could not read text layer of {pdf_path}: {str(e)}")
+        return [""] * pdfinfo_from_path(pdf_path)["Pages"]
 
-def extract_text_from_pdf_ocr(pdf_path: str) -> str:
+def _render_pages(pdf_path: str, first_page: int, last_page: int, output_folder: str) -> list:
+    """Render a range of pages (1-based, inclusive) as grayscale PNGs and return their paths."""
+    return convert_from_path(
+        pdf_path,
+        dpi=OCR_DPI,
+        grayscale=True,
+        first_page=first_page,
+        last_page=last_page,
+        use_pdftocairo=True,
+        output_folder=output_folder,
+        fmt="png",
+        paths_only=True
+    )
+
+def _render_spans(page_numbers: list) -> list:
+    """
+    Plan the page ranges to render for a sorted group of pages.
+    
+    Returns:
+        One (first, last) span covering the group when most of its pages
+        need OCR, otherwise one span per run of consecutive pages
+    """
+    first, last = page_numbers[0], page_numbers[-1]
+    if 2 * len(page_numbers) >= last - first + 1:
+        return [(first, last)]
+    spans = []
+    for n in page_numbers:
+        if spans and n == spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], n)
+        else:
+            spans.append((n, n))
+    return spans
+
+def _ocr_pages(pdf_path: str, output_folder: str, page_numbers: list) -> dict:
     """
-    Extract text from PDF using OCR.
+    Render and OCR a sorted group of pages (1-based) with one Tesseract engine.
+    
+    Returns:
+        Dict of page number to OCR text; pages that failed to render or OCR are left out
+    """
+    wanted = set(page_numbers)
+    texts = {}
+    api = None
+    if PyTessBaseAPI is not None:
+        try:
+            api = PyTessBaseAPI()
+        except RuntimeError as e:
+            # e.g. tessdata not found where tesserocr looks for it
+            print(f"tesserocr could not start, falling back to pytesseract: {str(e)}")
+    try:
+        for first, last in _render_spans(page_numbers):
+            try:
+                image_paths = _render_pages(pdf_path, first, last, output_folder)
+            except Exception as e:
+                print(f"Could not render pages {first}-{last} of {pdf_path}: {str(e)}")
+                continue
+            for n, image_path in zip(range(first, last + 1), image_paths):
+                try:
+                    if n in wanted:
+                        if api is None:
+                            texts[n] = pytesseract.image_to_string(image_path)
+                        else:
+                            api.SetImageFile(image_path)
+                            texts[n] = api.GetUTF8Text()
+                except Exception as e:
+                    print(f"OCR failed for page {n} of {pdf_path}: {str(e)}")
+                finally:
+                    os.remove(image_path)
+    finally:
+        if api is not None:
+            api.End()
+    return texts
+
+def extract_text_from_pdf_ocr(pdf_path: str, max_workers: int = None, cache_dir: str = None) -> str:
+    """
+    Extract text from PDF, using OCR for pages without a usable text layer.
     
     Args:
         pdf_path: Path to the PDF file
+        max_workers: Number of pages to OCR concurrently (defaults to OCR_MAX_WORKERS)
+        cache_dir: Directory for cached OCR results (optional)
         
     Returns:
         Extracted text from the PDF
     """
+    cache_path = None
     try:
-        images = convert_from_path(pdf_path)
-        text = ""
-        for image in images:
-            text += pytesseract.image_to_string(image)
-        return text
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, f"{compute_file_hash(pdf_path)}.txt")
+            if os.path.exists(cache_path):
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return f.read()
+
+        page_texts = _extract_text_layer(pdf_path)
+        missing = [i for i, page_text in enumerate(page_texts) if len(page_text.strip()) < OCR_MIN_TEXT_CHARS]
+        if missing:
+            workers = max(1, min(max_workers or OCR_MAX_WORKERS, len(missing)))
+            # One contiguous slice of pages per worker, so each engine is
+            # initialized once and can render its pages as a range
+            group_size = -(-len(missing) // workers)
+            groups = [missing[i:i + group_size] for i in range(0, len(missing), group_size)]
+            with tempfile.TemporaryDirectory(prefix="ocr_") as output_folder, \
+                    _tesseract_thread_limit(), ThreadPoolExecutor(max_workers=len(groups)) as executor:
+                ocr_pages = partial(_ocr_pages, pdf_path, output_folder)
+                # Pages whose OCR failed keep their text-layer text
+                for group_texts in executor.map(ocr_pages, [[i + 1 for i in group] for group in groups]):
+                    for n, page_text in group_texts.items():
+                        page_texts[n - 1] = page_text
+        text = "\n".join(page_texts)
     except Exception as e:
         print(f"OCR failed for {pdf_path}: {str(e)}")
         return ""
 
+    if cache_path and text.strip():
+        try:
+            write_file_atomic(cache_path, text.encode("utf-8"))
+        except OSError as e:
+            print(f"Could not cache OCR result for {pdf_path}: {str(e)}")
+    return text
+
 def extract_clean_metadata(raw_metadata, file_path):
     """
     Extract clean metadata from PDF metadata.
@@ -57,28 +268,132 @@ def extract_clean_metadata(raw_metadata, file_path):
                 cleaned[key] = str(value)
     return cleaned
 
-def get_existing_hashes(chroma_store) -> set:
+def get_existing_hashes(chroma_store, candidate_hashes=None, collection_name=None) -> set:
     """
     Get existing content hashes from Chroma store.
     
     Args:
         chroma_store: Chroma vector store instance
+        candidate_hashes: Hashes to check for (optional, defaults to all)
+        collection_name: Only consider chunks tagged with this collection (optional)
         
     Returns:
-        Set of existing content hashes
+        Set of existing content hashes as hash_key integers
     """
+    collection_filter = {"collection_name": collection_name} if collection_name else None
     existing_hashes = set()
     try:
-        results = chroma_store._collection.get(include=["metadatas"])
-        metadatas = results.get("metadatas", [])
+        if candidate_hashes is None:
+            results = chroma_store._collection.get(where=collection_filter, include=["metadatas"])
+            metadatas = results.get("metadatas", [])
+        else:
+            candidates = list(candidate_hashes)
+            metadatas = []
+            for start in range(0, len(candidates), HASH_LOOKUP_BATCH_SIZE):
+                where = {"content_hash": {"$in": candidates[start:start + HASH_LOOKUP_BATCH_SIZE]}}
+                if collection_filter:
+                    where = {"$and": [where, collection_filter]}
+                results = chroma_store._collection.get(where=where, include=["metadatas"])
+                metadatas.extend(results.get("metadatas", []))
         for metadata in metadatas:
             if metadata and "content_hash" in metadata:
-                existing_hashes.add(metadata["content_hash"])
+                existing_hashes.add(hash_key(metadata["content_hash"]))
     except Exception as e:
         print(f"Error retrieving existing hashes from Chroma: {str(e)}")
     return existing_hashes
 
-def ocr_and_update_chroma(doc_dir, persist_dir, chroma_store=None):
+def query_chroma_metadata(
+    persist_dir: str,
+    chroma_collection: str,
+    key: str,
+    collection_name: str = None,
+    distinct: bool = False
+) -> list:
+    """
+    Read one metadata field of a Chroma collection straight from its sqlite file.
+    
+    Args:
+        persist_dir: Directory the Chroma store is persisted in
+        chroma_collection: Name of the Chroma collection to read
+        key: Metadata key to return the string values of
+        collection_name: Only consider chunks tagged with this collection (optional)
+        distinct: Return each value once (optional)
+        
+    Returns:
+        List of the non-empty string values
+        
+    Raises:
+        sqlite3.Error: If the file can't be read or its schema doesn't match
+    """
+    query = f"""
+        SELECT {"DISTINCT " if distinct else ""}m.string_value
+        FROM embedding_metadata m
+        JOIN embeddings e ON e.id = m.id
+        JOIN segments s ON s.id = e.segment_id
+        JOIN collections c ON c.id = s.collection
+    """
+    params = [chroma_collection, key]
+    if collection_name:
+        query += """
+        JOIN embedding_metadata t
+            ON t.id = m.id AND t.key = 'collection_name' AND t.string_value = ?
+        """
+        params.insert(0, collection_name)
+    query += " WHERE c.name = ? AND m.key = ?"
+
+    db_path = os.path.join(persist_dir, "chroma.sqlite3")
+    # Read-only, so an open PersistentClient isn't disturbed
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in conn.execute(query, params) if row[0]]
+    finally:
+        conn.close()
+
+def get_existing_hashes_fast(persist_dir: str, chroma_store, collection_name=None) -> set:
+    """
+    Get existing content hashes from Chroma's sqlite file, falling back to the Chroma API.
+    
+    Args:
+        persist_dir: Directory the Chroma store is persisted in
+        chroma_store: Chroma vector store instance, used for its collection and the fallback
+        collection_name: Only consider chunks tagged with this collection (optional)
+        
+    Returns:
+        Set of existing content hashes as hash_key integers
+    """
+    try:
+        content_hashes = query_chroma_metadata(
+            persist_dir, chroma_store._collection.name, "content_hash", collection_name
+        )
+    except sqlite3.Error as e:
+        print(f"Falling back to Chroma API for existing hashes: {str(e)}")
+        return get_existing_hashes(chroma_store, collection_name=collection_name)
+
+    # A schema that still parses but no longer matches the join yields nothing
+    if not content_hashes and chroma_store._collection.count() > 0:
+        print("No hashes found in Chroma's sqlite file; falling back to Chroma API")
+        return get_existing_hashes(chroma_store, collection_name=collection_name)
+    return {hash_key(content_hash) for content_hash in content_hashes}
+
+def _ocr_and_chunk_one_pdf(path: str, cache_dir: str, max_workers: int) -> tuple:
+    """
+    OCR a single PDF and split it into chunks.
+    
+    Returns:
+        Tuple of (chunk texts, chunk hashes), both empty if OCR found no text
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    
+    print(f"Processing: {os.path.basename(path)}")
+    text = extract_text_from_pdf_ocr(path, max_workers=max_workers, cache_dir=cache_dir)
+    if not text.strip():
+        return [], []
+    
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunk_texts = text_splitter.split_text(text)
+    return chunk_texts, compute_hashes(chunk_texts)
+
+def ocr_and_update_chroma(doc_dir, persist_dir, chroma_store=None, embeddings=None):
     """
     Apply OCR to PDF documents and update Chroma store.
     
@@ -86,70 +401,92 @@ def ocr_and_update_chroma(doc_dir, persist_dir, chroma_store=None):
         doc_dir: Directory containing PDF documents
         persist_dir: Directory to persist Chroma store
         chroma_store: Existing Chroma store instance (optional)
+        embeddings: Already loaded embedding function (optional)
         
     Returns:
         Updated or new Chroma store instance
     """
-    from langchain_huggingface import HuggingFaceEmbeddings
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
     from langchain_community.vectorstores import Chroma
     import chromadb
+    from vector_store import (
+        UNIFIED_COLLECTION_NAME,
+        add_documents_with_embeddings,
+        get_or_create_collection,
+        initialize_embeddings
+    )
     
     collection_name = sanitize_collection_name(os.path.basename(doc_dir))
     print(f"Using collection name: `{collection_name}`")
     
-    # Initialize embeddings if not provided
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+    files = [file for file in sorted(os.listdir(doc_dir)) if file.lower().endswith(".pdf")]
+    paths = [os.path.join(doc_dir, file) for file in files]
+    cache_dir = os.path.join(persist_dir, "ocr_cache")
+    
+    print("Scanning and applying OCR to all PDFs...")
+    
+    # Split the OCR worker budget between files processed in parallel and
+    # pages OCR'd in parallel within each file
+    file_workers = max(1, min(OCR_MAX_WORKERS, len(paths)))
+    page_workers = max(1, OCR_MAX_WORKERS // file_workers)
+    if file_workers > 1:
+        # Spawned rather than forked: a caller may already hold a loaded
+        # (CUDA or compiled) embedding model with running torch threads
+        spawn_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=file_workers, mp_context=spawn_context) as executor:
+            results = list(executor.map(
+                _ocr_and_chunk_one_pdf, paths, [cache_dir] * len(paths), [page_workers] * len(paths)
+            ))
+    else:
+        results = [_ocr_and_chunk_one_pdf(path, cache_dir, page_workers) for path in paths]
+    
+    file_chunks = []
+    for file, path, (chunk_texts, hashes) in zip(files, paths, results):
+        if not chunk_texts:
+            print(f"OCR returned empty text for {file}")
+            continue
+        file_chunks.append((file, path, chunk_texts, hashes))
+    
+    # Nothing needs the embedding model before insertion, so load it after OCR
+    if embeddings is None:
+        embeddings = initialize_embeddings()
     
     # Initialize Chroma store if not provided
     if not chroma_store:
+        client = chromadb.PersistentClient(path=persist_dir)
+        get_or_create_collection(client, UNIFIED_COLLECTION_NAME)
         chroma_store = Chroma(
-            client=chromadb.PersistentClient(path=persist_dir),
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=persist_dir
+            client=client,
+            collection_name=UNIFIED_COLLECTION_NAME,
+            embedding_function=embeddings
         )
     
-    existing_hashes = get_existing_hashes(chroma_store)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    # Only ask Chroma about the hashes we are about to insert
+    candidate_hashes = {chunk_hash for *_, hashes in file_chunks for chunk_hash in hashes}
+    existing_hashes = get_existing_hashes(chroma_store, candidate_hashes, collection_name)
     new_chunks = []
     
-    print("Scanning and applying OCR to all PDFs...")
-    
-    for i, file in enumerate(sorted(os.listdir(doc_dir))):
-        path = os.path.join(doc_dir, file)
-        if file.lower().endswith(".pdf"):
-            print(f"Processing: {file}")
-            text = extract_text_from_pdf_ocr(path)
-            
-            if not text.strip():
-                print(f"OCR returned empty text for {file}")
-                continue
-            
-            chunks = text_splitter.split_documents([Document(page_content=text, metadata={})])
-            filtered_chunks = []
-            
-            for chunk in chunks:
-                chunk_hash = compute_hash(chunk.page_content)
-                if chunk_hash not in existing_hashes:
-                    chunk.metadata = {
-                        "source": path,
-                        "file_name": file,
-                        "content_hash": chunk_hash,
-                        "section": "ocr_recovered"
-                    }
-                    filtered_chunks.append(chunk)
-            
-            if filtered_chunks:
-                print(f"Found {len(filtered_chunks)} new chunks to add from {file}")
-                new_chunks.extend(filtered_chunks)
-            else:
-                print(f"All OCR chunks already exist in Chroma for {file}")
+    for file, path, chunk_texts, hashes in file_chunks:
+        base_meta = {
+            "source": path,
+            "file_name": file,
+            "section": "ocr_recovered",
+            "collection_name": collection_name
+        }
+        filtered_chunks = [
+            Document(page_content=chunk_text, metadata={**base_meta, "content_hash": chunk_hash})
+            for chunk_text, chunk_hash in zip(chunk_texts, hashes)
+            if is_new_hash(chunk_hash, existing_hashes)
+        ]
+        
+        if filtered_chunks:
+            print(f"Found {len(filtered_chunks)} new chunks to add from {file}")
+            new_chunks.extend(filtered_chunks)
+        else:
+            print(f"All OCR chunks already exist in Chroma for {file}")
     
     if new_chunks:
         print(f"Adding {len(new_chunks)} new OCR-recovered chunks...")
-        chroma_store.add_documents(new_chunks)
-        chroma_store.persist()
+        add_documents_with_embeddings(chroma_store, new_chunks, embeddings)
         print("Chroma DB updated successfully!")
     else:
         print("No new OCR chunks to add.")
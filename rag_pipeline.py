@@ -1,11 +1,17 @@
+import math
 import os
-import time
-from typing import List, Literal, Dict, TypedDict, Annotated
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Literal, Dict, Optional, TypedDict, Annotated
 
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 from langchain import hub
 
+# Speculative retrieval on the raw question is kept when the structured
+# query's embedding is at least this cosine-similar to the question's
+QUERY_REUSE_SIMILARITY = float(os.environ.get("QUERY_REUSE_SIMILARITY", "0.85"))
+
 # Initialize the Mistral chat model
 def setup_llm():
     """Initialize the LLM for RAG pipeline."""
@@ -14,11 +20,26 @@ def setup_llm():
     if not os.environ.get("MISTRAL_API_KEY"):
         raise ValueError("MISTRAL_API_KEY environment variable not set")
     
+    rate_limiter = None
+    requests_per_second = os.environ.get("MISTRAL_REQUESTS_PER_SECOND")
+    if requests_per_second:
+        from langchain_core.rate_limiters import InMemoryRateLimiter
+        rate_limiter = InMemoryRateLimiter(requests_per_second=float(requests_per_second))
+    
     return ChatMistralAI(
         model="mistral-large-latest",
-        api_key=os.environ.get("MISTRAL_API_KEY")
+        api_key=os.environ.get("MISTRAL_API_KEY"),
+        max_retries=5,
+        max_concurrent_requests=8,
+        timeout=30,
+        rate_limiter=rate_limiter
     )
 
+@lru_cache(maxsize=1)
+def get_rag_prompt():
+    """Pull the RAG prompt from LangChain Hub once per process."""
+    return hub.pull("rlm/rag-prompt")
+
 # Define the RAG pipeline components
 class Search(TypedDict):
     """Search query."""
@@ -31,6 +52,13 @@ class State(TypedDict):
     query: Search
     context: List[Document]
     answer: str
+    collection_name: Optional[str]
+
+def _cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two embedding vectors."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
 
 def setup_rag_pipeline(client, persist_dir, embeddings):
     """
@@ -51,7 +79,7 @@ def setup_rag_pipeline(client, persist_dir, embeddings):
     llm = setup_llm()
     
     # Get the RAG prompt from LangChain Hub
-    prompt = hub.pull("rlm/rag-prompt")
+    prompt = get_rag_prompt()
     
     # Define RAG functions
     def analyze_query(state: State) -> Dict:
@@ -60,22 +88,40 @@ def setup_rag_pipeline(client, persist_dir, embeddings):
         query = structured_llm.invoke(state["question"])
         return {"query": query}
 
-    def retrieve(state: State) -> Dict:
-        """Retrieve relevant documents based on the query."""
-        query = state["query"]
-        retrieved_docs = unified_search(
+    def retrieve(query: Search, query_embedding: List[float], collection_name: str = None) -> List[Document]:
+        """Retrieve relevant documents for an already embedded query."""
+        return unified_search(
             client,
             persist_dir,
             embeddings,
             query=query["query"],
             k=4,
-            filter_section=query["section"]
+            filter_section=query["section"],
+            collection_name=collection_name,
+            query_embedding=query_embedding
         )
-        return {"context": retrieved_docs}
+
+    def retrieve_question(question: str, collection_name: str = None) -> tuple:
+        """Embed the raw question and retrieve documents for it."""
+        question_embedding = embeddings.embed_query(question)
+        query = {"query": question, "section": "all_sections"}
+        return question_embedding, retrieve(query, question_embedding, collection_name)
+
+    def analyze_and_retrieve(state: State) -> Dict:
+        """Analyze the question while speculatively retrieving context for it."""
+        collection_name = state.get("collection_name")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            speculative = executor.submit(retrieve_question, state["question"], collection_name)
+            query = analyze_query(state)["query"]
+            question_embedding, context = speculative.result()
+        if query["query"] != state["question"]:
+            query_embedding = embeddings.embed_query(query["query"])
+            if _cosine_similarity(query_embedding, question_embedding) < QUERY_REUSE_SIMILARITY:
+                context = retrieve(query, query_embedding, collection_name)
+        return {"query": query, "context": context}
 
     def generate(state: State) -> Dict:
         """Generate an answer based on the retrieved context."""
-        time.sleep(1)  # Rate limit protection
         docs_content = "\n\n".join(doc.page_content for doc in state["context"])
         messages = prompt.invoke({"question": state["question"], "context": docs_content})
         response = llm.invoke(messages)
@@ -83,14 +129,12 @@ def setup_rag_pipeline(client, persist_dir, embeddings):
 
     # Build the execution graph
     graph_builder = StateGraph(State)
-    graph_builder.add_node("analyze_query", analyze_query)
-    graph_builder.add_node("retrieve", retrieve)
+    graph_builder.add_node("analyze_and_retrieve", analyze_and_retrieve)
     graph_builder.add_node("generate", generate)
     
     # Define the graph edges
-    graph_builder.add_edge(START, "analyze_query")
-    graph_builder.add_edge("analyze_query", "retrieve")
-    graph_builder.add_edge("retrieve", "generate")
+    graph_builder.add_edge(START, "analyze_and_retrieve")
+    graph_builder.add_edge("analyze_and_retrieve", "generate")
     
     # Compile the graph
     graph = graph_builder.compile()
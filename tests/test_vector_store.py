@@ -0,0 +1,105 @@
+import uuid
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+vector_store = pytest.importorskip("vector_store")
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ocr_utils import compute_hash, get_existing_hashes, get_existing_hashes_fast
+
+
+def _ingest(persist_dir, texts_by_collection):
+    """Write chunks tagged with their collection into a real PersistentClient."""
+    client = chromadb.PersistentClient(path=str(persist_dir))
+    collection = vector_store.get_or_create_collection(client, vector_store.UNIFIED_COLLECTION_NAME)
+    for collection_name, texts in texts_by_collection.items():
+        collection.add(
+            ids=[str(uuid.uuid4()) for _ in texts],
+            documents=texts,
+            metadatas=[
+                {
+                    "content_hash": compute_hash(text),
+                    "section": "all_sections",
+                    "collection_name": collection_name
+                }
+                for text in texts
+            ],
+            embeddings=[[1.0, float(i), 0.5] for i in range(len(texts))]
+        )
+    return client
+
+
+@pytest.mark.parametrize("collection_name", [None, "reports", "missing"])
+def test_get_existing_hashes_fast_matches_chroma_api(tmp_path, collection_name):
+    client = _ingest(tmp_path, {
+        "reports": ["annual report", "quarterly report"],
+        "manuals": ["install guide", "user guide", "annual report"]
+    })
+    chroma_store = vector_store.Chroma(
+        client=client,
+        collection_name=vector_store.UNIFIED_COLLECTION_NAME,
+        embedding_function=None
+    )
+
+    expected = get_existing_hashes(chroma_store, collection_name=collection_name)
+
+    assert get_existing_hashes_fast(str(tmp_path), chroma_store, collection_name) == expected
+    if collection_name != "missing":
+        assert expected
+
+
+def test_list_collection_names_returns_distinct_tags(tmp_path):
+    client = _ingest(tmp_path, {
+        "reports": ["annual report", "quarterly report"],
+        "manuals": ["install guide"]
+    })
+
+    assert vector_store.list_collection_names(client, str(tmp_path)) == ["manuals", "reports"]
+
+
+def _chunk(text, start_index=None):
+    metadata = {"source": "a.pdf", "page": 0}
+    if start_index is not None:
+        metadata["start_index"] = start_index
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_merge_small_chunks_does_not_repeat_overlap():
+    text = "aaaa bbbb cccc dddd"
+    chunks = [_chunk("aaaa bbbb", 0), _chunk("bbbb cccc", 5), _chunk("dddd", 15)]
+
+    merged = vector_store._merge_small_chunks(text, chunks, chunk_size=20, chunk_overlap=5)
+
+    assert [chunk.page_content for chunk in merged] == ["aaaa bbbb cccc", "dddd"]
+    assert all("start_index" not in chunk.metadata for chunk in merged)
+
+
+def test_merge_small_chunks_stays_within_size_limit():
+    chunk_size, chunk_overlap = 100, 20
+    text = "\n\n".join(" ".join(f"w{p}{i}" for i in range(n)) for p, n in enumerate([3, 25, 4, 2, 40, 5, 1]))
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    chunks = splitter.split_documents([Document(page_content=text, metadata={"source": "a.pdf"})])
+    original = [chunk.page_content for chunk in chunks]
+
+    merged = vector_store._merge_small_chunks(text, chunks, chunk_size, chunk_overlap)
+
+    assert len(merged) < len(original)
+    for chunk in merged:
+        assert chunk.page_content in text
+        if chunk.page_content not in original:
+            assert len(chunk.page_content) <= chunk_size - chunk_overlap
+
+
+def test_merge_small_chunks_passes_through_chunks_without_start_index():
+    text = "aaaa bbbb cccc"
+    chunks = [_chunk("aaaa"), _chunk("bbbb", -1), _chunk("cccc")]
+
+    merged = vector_store._merge_small_chunks(text, chunks, chunk_size=100, chunk_overlap=0)
+
+    assert [chunk.page_content for chunk in merged] == ["aaaa", "bbbb", "cccc"]
+    assert [chunk.metadata for chunk in merged] == [{"source": "a.pdf", "page": 0}] * 3
@@ -1,7 +1,12 @@
 import os
 import re
 import hashlib
+import pickle
+import sqlite3
+import uuid
 import chromadb
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
 from pathlib import Path
 from typing import List, Optional, Set, Dict, Any, Tuple
 
@@ -11,22 +16,130 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from PyPDF2 import PdfReader
+import fitz  # PyMuPDF
 
-from ocr_utils import sanitize_collection_name, compute_hash, extract_clean_metadata
+from ocr_utils import (
+    sanitize_collection_name,
+    compute_hashes,
+    compute_file_hash,
+    extract_clean_metadata,
+    is_new_hash,
+    query_chroma_metadata,
+    write_file_atomic
+)
+
+# Number of worker processes extracting PDF text in parallel
+PDF_LOAD_WORKERS = int(os.environ.get("PDF_LOAD_WORKERS", os.cpu_count() or 1))
+
+# Below this many documents, splitting in-process beats the pool start-up cost
+SPLIT_PARALLEL_MIN_DOCS = int(os.environ.get("SPLIT_PARALLEL_MIN_DOCS", "512"))
+
+# Number of chunks embedded per block while streaming inserts
+INGEST_BLOCK_SIZE = int(os.environ.get("INGEST_BLOCK_SIZE", "1024"))
+
+# Number of chunks written to Chroma per add call; each call is one sqlite
+# transaction, so by default a whole embedded block is committed at once
+CHROMA_BATCH_SIZE = int(os.environ.get("CHROMA_BATCH_SIZE", INGEST_BLOCK_SIZE))
+
+# All chunks live in this one Chroma collection; the user-facing collection
+# name is stored on each chunk as `collection_name` metadata
+UNIFIED_COLLECTION_NAME = "unified"
+
+# HNSW index parameters applied when a collection is created
+HNSW_COLLECTION_METADATA = {
+    "hnsw:space": os.environ.get("HNSW_SPACE", "cosine"),
+    "hnsw:construction_ef": int(os.environ.get("HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:M": int(os.environ.get("HNSW_M", "32")),
+    "hnsw:search_ef": int(os.environ.get("HNSW_SEARCH_EF", "100")),
+}
+
+# Embedding model settings
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+# sentence-transformers backend: "torch", or "onnx" for ONNX Runtime
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# Compile the transformer with torch.compile ("1" to enable, torch backend only)
+EMBEDDING_COMPILE = os.environ.get("EMBEDDING_COMPILE", "0") == "1"
+# Intra-op threads PyTorch uses for CPU inference
+# (defaults to the CPUs this process may run on, not the host's count)
+EMBEDDING_NUM_THREADS = int(os.environ.get(
+    "EMBEDDING_NUM_THREADS",
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+))
+
+def get_embedding_device() -> str:
+    """Pick the device for the embedding model, preferring CUDA when available."""
+    device = os.environ.get("EMBEDDING_DEVICE")
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def get_embedding_dtype(device: str):
+    """Pick the weight dtype for the embedding model: float16 on CUDA, float32 otherwise."""
+    import torch
+    dtype = os.environ.get("EMBEDDING_DTYPE")
+    if dtype:
+        return getattr(torch, dtype)
+    return torch.float16 if device.startswith("cuda") else torch.float32
+
+def configure_torch_threads() -> None:
+    """Size PyTorch's CPU thread pools for embedding."""
+    import torch
+    torch.set_num_threads(EMBEDDING_NUM_THREADS)
+    try:
+        torch.set_num_interop_threads(max(1, EMBEDDING_NUM_THREADS // 4))
+    except RuntimeError:
+        pass
+
+def compile_embedding_model(embeddings) -> None:
+    """Compile the embedding model with torch.compile and warm it up, keeping the eager model on failure."""
+    import torch
+    # langchain_huggingface keeps the SentenceTransformer private
+    model = getattr(embeddings, "_client", None) or getattr(embeddings, "client", None)
+    if model is None:
+        print("Embedding model not found; skipping torch.compile.")
+        return
+    print("Compiling embedding model...")
+    transformer = model[0]
+    eager_model = transformer.auto_model
+    try:
+        # Default mode: CUDA graphs would be re-recorded per input shape and thread
+        transformer.auto_model = torch.compile(eager_model, dynamic=True)
+        embeddings.embed_query("warmup")
+    except Exception as e:
+        print(f"torch.compile failed, using eager model: {str(e)}")
+        transformer.auto_model = eager_model
 
 def initialize_embeddings():
     """Initialize HuggingFace Embeddings."""
-    print("Initializing embedding model...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+    device = get_embedding_device()
+    if EMBEDDING_BACKEND == "torch":
+        dtype = get_embedding_dtype(device)
+        if device == "cpu":
+            configure_torch_threads()
+        model_kwargs = {"device": device, "model_kwargs": {"torch_dtype": dtype}}
+        print(f"Initializing embedding model on {device} ({dtype})...")
+    else:
+        provider = "CUDAExecutionProvider" if device.startswith("cuda") else "CPUExecutionProvider"
+        model_kwargs = {"device": device, "backend": EMBEDDING_BACKEND, "model_kwargs": {"provider": provider}}
+        print(f"Initializing embedding model with {EMBEDDING_BACKEND} backend ({provider})...")
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE}
+    )
+    if EMBEDDING_COMPILE and EMBEDDING_BACKEND == "torch":
+        compile_embedding_model(embeddings)
     print("Embedding model loaded.")
     return embeddings
 
-def connect_to_chroma(persist_dir: str):
-    """Connect to a Chroma PersistentClient."""
+def connect_to_chroma(persist_dir: str, client=None):
+    """Connect to a Chroma PersistentClient, reusing `client` when given."""
     print(f"Connecting to Chroma DB at {persist_dir}...")
     try:
-        client = chromadb.PersistentClient(path=persist_dir)
+        if client is None:
+            client = chromadb.PersistentClient(path=persist_dir)
         collections_info = client.list_collections()
         collection_names = [col if isinstance(col, str) else col.get("name") for col in collections_info]
         print(f"Found {len(collection_names)} existing collections")
@@ -35,43 +148,123 @@ def connect_to_chroma(persist_dir: str):
         print(f"Error connecting to Chroma: {str(e)}")
         return None, []
 
-def load_documents_from_directory(docs_path: str) -> List[Document]:
+def get_or_create_collection(client, collection_name: str):
+    """Get a Chroma collection, creating it with the tuned HNSW settings if missing."""
+    try:
+        return client.get_collection(collection_name)
+    except Exception:
+        print(f"Creating collection {collection_name} with HNSW settings {HNSW_COLLECTION_METADATA}")
+        return client.create_collection(collection_name, metadata=HNSW_COLLECTION_METADATA)
+
+def _extract_pdf(file_path: str, cache_dir: str = None) -> List[Document]:
+    """Extract one Document per non-empty page of a PDF, cached by file hash when `cache_dir` is given."""
+    cache_path = None
+    if cache_dir:
+        try:
+            cache_path = os.path.join(cache_dir, f"{compute_file_hash(file_path)}.pkl")
+            if os.path.exists(cache_path):
+                with open(cache_path, "rb") as f:
+                    docs = pickle.load(f)
+                # The same bytes may have been uploaded under another path
+                for doc in docs:
+                    doc.metadata.update(source=file_path, file_name=os.path.basename(file_path))
+                return docs
+        except Exception as e:
+            print(f"Could not read extraction cache for {file_path}: {str(e)}")
+
+    docs = []
+    try:
+        with fitz.open(file_path) as pdf:
+            pdf_metadata = extract_clean_metadata(pdf.metadata, file_path)
+
+            for page_num, page in enumerate(pdf):
+                text = page.get_text("text")
+                if text and text.strip():  # Avoid empty pages
+                    docs.append(Document(
+                        page_content=text,
+                        metadata={**pdf_metadata, "page": page_num}
+                    ))
+    except Exception as e:
+        print(f"Error loading {file_path}: {str(e)}")
+        return docs
+
+    if cache_path:
+        try:
+            write_file_atomic(cache_path, pickle.dumps(docs))
+        except OSError as e:
+            print(f"Could not cache extracted text for {file_path}: {str(e)}")
+    return docs
+
+def load_documents_from_directory(docs_path: str, cache_dir: str = None) -> List[Document]:
     """
     Load documents from a directory path.
     
     Args:
         docs_path: Path to directory containing documents
+        cache_dir: Directory for cached PDF extraction results (optional)
         
     Returns:
         List of Document objects
     """
-    docs = []
+    pdf_paths = []
+    txt_paths = []
     for root, _, files in os.walk(docs_path):
         for file in files:
             file_path = os.path.join(root, file)
             if file.endswith(".pdf"):
-                try:
-                    raw_reader = PdfReader(file_path)
-                    pdf_metadata = extract_clean_metadata(raw_reader.metadata, file_path)
-
-                    for page_num, page in enumerate(raw_reader.pages):
-                        text = page.extract_text()
-                        if text and text.strip():  # Avoid empty pages
-                            docs.append(Document(
-                                page_content=text,
-                                metadata={**pdf_metadata, "page": page_num}
-                            ))
-                except Exception as e:
-                    print(f"Error loading {file_path}: {str(e)}")
+                pdf_paths.append(file_path)
             elif file.endswith(".txt"):
-                loader = TextLoader(file_path)
-                docs.extend(loader.load())
+                txt_paths.append(file_path)
+
+    workers = max(1, min(PDF_LOAD_WORKERS, len(pdf_paths)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extracted = executor.map(_extract_pdf, pdf_paths, repeat(cache_dir), chunksize=4)
+            docs = list(chain.from_iterable(extracted))
+    else:
+        docs = list(chain.from_iterable(_extract_pdf(file_path, cache_dir) for file_path in pdf_paths))
+
+    for file_path in txt_paths:
+        loader = TextLoader(file_path)
+        docs.extend(loader.load())
     return docs
 
+def _merge_small_chunks(text: str, chunks: List[Document], chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """Fuse adjacent undersized chunks of one document without repeating their overlap."""
+    merged = []
+    spans = []
+    for chunk in chunks:
+        start = chunk.metadata.pop("start_index", -1)
+        end = start + len(chunk.page_content)
+        if merged and start >= 0 and spans[-1][0] >= 0:
+            prev_start = spans[-1][0]
+            if end - prev_start + chunk_overlap <= chunk_size:
+                merged[-1].page_content = text[prev_start:end]
+                spans[-1] = (prev_start, end)
+                continue
+        merged.append(chunk)
+        spans.append((start, end))
+    return merged
+
+def _split_documents(docs: List[Document], chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """Split each document with a recursive character splitter, then merge small chunks."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True
+    )
+    splits = []
+    for doc in docs:
+        splits.extend(_merge_small_chunks(
+            doc.page_content, text_splitter.split_documents([doc]), chunk_size, chunk_overlap
+        ))
+    return splits
+
 def split_and_prepare_documents(
     docs: List[Document], 
     chunk_size: int = 1000, 
-    chunk_overlap: int = 200
+    chunk_overlap: int = 200,
+    collection_name: str = None
 ) -> List[Document]:
     """
     Split documents into smaller chunks for vector store.
@@ -80,28 +273,68 @@ def split_and_prepare_documents(
         docs: List of documents to split
         chunk_size: Size of each chunk
         chunk_overlap: Overlap between chunks
+        collection_name: Logical collection recorded on each chunk (optional)
         
     Returns:
         List of split document chunks
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    all_splits = text_splitter.split_documents(docs)
+    workers = max(1, min(PDF_LOAD_WORKERS, len(docs) // SPLIT_PARALLEL_MIN_DOCS))
+    if workers > 1:
+        # Splitting is pure CPU and independent per document
+        shard_size = -(-len(docs) // (workers * 4))
+        shards = [docs[i:i + shard_size] for i in range(0, len(docs), shard_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            split_shards = executor.map(
+                _split_documents, shards, [chunk_size] * len(shards), [chunk_overlap] * len(shards)
+            )
+            all_splits = list(chain.from_iterable(split_shards))
+    else:
+        all_splits = _split_documents(docs, chunk_size, chunk_overlap)
     
     # Add content hash to each chunk
-    for doc in all_splits:
-        doc.metadata["content_hash"] = compute_hash(doc.page_content)
-        doc.metadata["section"] = "all_sections"
+    hashes = compute_hashes(doc.page_content for doc in all_splits)
+    for doc, content_hash in zip(all_splits, hashes):
+        doc.metadata.update(content_hash=content_hash, section="all_sections")
+        if collection_name:
+            doc.metadata["collection_name"] = collection_name
     
     return all_splits
 
+def add_documents_with_embeddings(chroma_store: Chroma, docs: List[Document], embeddings) -> None:
+    """
+    Embed documents in length-sorted blocks and stream them into the store's collection.
+    
+    Args:
+        chroma_store: Chroma store to write to
+        docs: Documents to add
+        embeddings: Embedding function
+    """
+    batch_size = CHROMA_BATCH_SIZE
+    get_max_batch_size = getattr(chroma_store._client, "get_max_batch_size", None)
+    if get_max_batch_size is not None:
+        batch_size = min(batch_size, get_max_batch_size())
+
+    docs = sorted(docs, key=lambda doc: len(doc.page_content))
+    for block_start in range(0, len(docs), INGEST_BLOCK_SIZE):
+        block = docs[block_start:block_start + INGEST_BLOCK_SIZE]
+        texts = [doc.page_content for doc in block]
+        vectors = embeddings.embed_documents(texts)
+        for start in range(0, len(block), batch_size):
+            end = start + batch_size
+            chroma_store._collection.add(
+                ids=[str(uuid.uuid4()) for _ in texts[start:end]],
+                documents=texts[start:end],
+                metadatas=[doc.metadata for doc in block[start:end]],
+                embeddings=vectors[start:end]
+            )
+        print(f"Added {block_start + len(block)}/{len(docs)} chunks.")
+
 def create_new_vector_store(
     embeddings, 
     persist_dir: str, 
     docs_path: str, 
-    collection_name: str
+    collection_name: str,
+    client=None
 ) -> Chroma:
     """
     Create a new Chroma vector store.
@@ -111,25 +344,34 @@ def create_new_vector_store(
         persist_dir: Directory to persist Chroma store
         docs_path: Path to documents
         collection_name: Name of collection
+        client: Existing Chroma client (optional)
         
     Returns:
         New Chroma vector store
     """
     print("Loading documents...")
-    docs = load_documents_from_directory(docs_path)
+    docs = load_documents_from_directory(docs_path, os.path.join(persist_dir, "extract_cache"))
     print(f"Loaded {len(docs)} documents.")
 
     print("Splitting documents into chunks...")
-    all_splits = split_and_prepare_documents(docs)
+    all_splits = split_and_prepare_documents(docs, collection_name=collection_name)
     print(f"Split into {len(all_splits)} chunks.")
 
+    # Drop repeated chunks before they are embedded
+    seen_hashes = set()
+    all_splits = [chunk for chunk in all_splits if is_new_hash(chunk.metadata["content_hash"], seen_hashes)]
+    print(f"Kept {len(all_splits)} unique chunks.")
+
     print("Creating new Chroma DB...")
-    chroma_store = Chroma.from_documents(
-        documents=all_splits,
-        embedding=embeddings,
-        collection_name=collection_name,
-        persist_directory=persist_dir
+    if client is None:
+        client = chromadb.PersistentClient(path=persist_dir)
+    chroma_store = Chroma(
+        client=client,
+        collection_name=UNIFIED_COLLECTION_NAME,
+        embedding_function=embeddings,
+        collection_metadata=HNSW_COLLECTION_METADATA
     )
+    add_documents_with_embeddings(chroma_store, all_splits, embeddings)
     print("New Chroma DB created and saved successfully!")
     return chroma_store
 
@@ -137,7 +379,10 @@ def update_vectorstore(
     chroma_store: Chroma,
     new_docs_path: str,
     chunk_size: int = 1000,
-    chunk_overlap: int = 200
+    chunk_overlap: int = 200,
+    collection_name: str = None,
+    cache_dir: str = None,
+    persist_dir: str = None
 ) -> Chroma:
     """
     Update existing Chroma vector store with new documents.
@@ -147,18 +392,24 @@ def update_vectorstore(
         new_docs_path: Path to new documents
         chunk_size: Size of each chunk
         chunk_overlap: Overlap between chunks
+        collection_name: Logical collection to add the chunks to (optional)
+        cache_dir: Directory for cached PDF extraction results (optional)
+        persist_dir: Directory the store is persisted in, enables the direct sqlite hash lookup (optional)
         
     Returns:
         Updated Chroma vector store
     """
-    from ocr_utils import get_existing_hashes
+    from ocr_utils import get_existing_hashes, get_existing_hashes_fast
     
     print("Retrieving existing content hashes from Chroma...")
-    existing_hashes = get_existing_hashes(chroma_store)
+    if persist_dir:
+        existing_hashes = get_existing_hashes_fast(persist_dir, chroma_store, collection_name)
+    else:
+        existing_hashes = get_existing_hashes(chroma_store, collection_name=collection_name)
     print(f"Found {len(existing_hashes)} existing hashes.")
 
     print(f"Loading new documents from: {new_docs_path}")
-    raw_docs = load_documents_from_directory(new_docs_path)
+    raw_docs = load_documents_from_directory(new_docs_path, cache_dir)
     print(f"Loaded {len(raw_docs)} raw documents.")
 
     if not raw_docs:
@@ -166,33 +417,31 @@ def update_vectorstore(
         return chroma_store
 
     print("Splitting documents into chunks...")
-    split_docs = split_and_prepare_documents(raw_docs, chunk_size, chunk_overlap)
+    split_docs = split_and_prepare_documents(raw_docs, chunk_size, chunk_overlap, collection_name)
     print(f"Split into {len(split_docs)} chunks.")
 
-    # Filter out already existing chunks
-    unique_chunks = []
-    for chunk in split_docs:
-        chunk_hash = compute_hash(chunk.page_content)
-        chunk.metadata["content_hash"] = chunk_hash
-        chunk.metadata["section"] = "all_sections"
-
-        if chunk_hash not in existing_hashes:
-            unique_chunks.append(chunk)
+    # Filter out already existing chunks and repeats within this batch
+    # Hash and section were already set by split_and_prepare_documents
+    unique_chunks = [
+        chunk for chunk in split_docs
+        if is_new_hash(chunk.metadata["content_hash"], existing_hashes)
+    ]
 
     print(f"Found {len(unique_chunks)} new unique chunks to add.")
 
     if unique_chunks:
         print("Adding new unique chunks to Chroma...")
-        chroma_store.add_documents(unique_chunks)
-        chroma_store.persist()
-        print(f"Successfully added {len(unique_chunks)} new chunks and persisted.")
+        add_documents_with_embeddings(chroma_store, unique_chunks, chroma_store.embeddings)
+        print(f"Successfully added {len(unique_chunks)} new chunks.")
 
     return chroma_store
 
 def initialize_or_update_vector_store(
     persist_dir: str, 
     docs_path: str, 
-    collection_name: str = None
+    collection_name: str = None,
+    embeddings=None,
+    client=None
 ) -> Chroma:
     """
     Initialize or update a Chroma vector store.
@@ -201,6 +450,8 @@ def initialize_or_update_vector_store(
         persist_dir: Directory to persist Chroma store
         docs_path: Path to documents
         collection_name: Name of collection (optional)
+        embeddings: Already loaded embedding function (optional)
+        client: Existing Chroma client (optional)
         
     Returns:
         New or updated Chroma vector store
@@ -210,48 +461,88 @@ def initialize_or_update_vector_store(
         collection_name = sanitize_collection_name(collection_name)
         print(f"Using dynamic collection name: {collection_name}")
 
-    # Initialize embeddings
-    embeddings = initialize_embeddings()
+    # Initialize embeddings if not provided
+    if embeddings is None:
+        embeddings = initialize_embeddings()
 
     # Connect to Chroma
-    client, collections = connect_to_chroma(persist_dir)
+    client, collections = connect_to_chroma(persist_dir, client)
     
-    # Check if collection exists
-    collection_exists = False
-    for col in collections:
-        col_name = col if isinstance(col, str) else col.get("name")
-        if col_name == collection_name:
-            collection_exists = True
-            break
+    # Check if the unified collection exists
+    collection_exists = any(_collection_name(col) == UNIFIED_COLLECTION_NAME for col in collections)
     
     if collection_exists:
         # Update existing collection
-        print(f"Found existing collection: {collection_name}")
+        print(f"Adding to existing store under collection: {collection_name}")
         chroma_store = Chroma(
             client=client,
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=persist_dir
+            collection_name=UNIFIED_COLLECTION_NAME,
+            embedding_function=embeddings
         )
         print("Updating Chroma vector store...")
-        update_vectorstore(chroma_store, docs_path)
+        update_vectorstore(
+            chroma_store,
+            docs_path,
+            collection_name=collection_name,
+            cache_dir=os.path.join(persist_dir, "extract_cache"),
+            persist_dir=persist_dir
+        )
         return chroma_store
     else:
         # Create new collection
-        print(f"Creating new collection: {collection_name}")
-        chroma_store = create_new_vector_store(embeddings, persist_dir, docs_path, collection_name)
+        print(f"Creating new store with collection: {collection_name}")
+        chroma_store = create_new_vector_store(embeddings, persist_dir, docs_path, collection_name, client)
         return chroma_store
 
+def _collection_name(collection) -> str:
+    """Get a collection's name from any of the shapes list_collections returns."""
+    if isinstance(collection, str):
+        return collection
+    if isinstance(collection, dict):
+        return collection.get("name")
+    return collection.name
+
+def list_collection_names(client, persist_dir: str) -> List[str]:
+    """
+    List the `collection_name` tags stored in the unified Chroma collection.
+    
+    Args:
+        client: Chroma client
+        persist_dir: Directory where Chroma is persisted
+        
+    Returns:
+        Sorted list of collection names
+    """
+    try:
+        return sorted(query_chroma_metadata(
+            persist_dir, UNIFIED_COLLECTION_NAME, "collection_name", distinct=True
+        ))
+    except sqlite3.Error as e:
+        print(f"Falling back to Chroma API to list collections: {str(e)}")
+
+    try:
+        collection = client.get_collection(UNIFIED_COLLECTION_NAME)
+        metadatas = collection.get(include=["metadatas"]).get("metadatas", [])
+    except Exception as e:
+        print(f"Error listing collections: {str(e)}")
+        return []
+    return sorted({
+        metadata["collection_name"] for metadata in metadatas
+        if metadata and metadata.get("collection_name")
+    })
+
 def unified_search(
     client,
     persist_dir,
     embeddings,
     query: str,
     k: int = 10,
-    filter_section: str = "all_sections"
+    filter_section: str = "all_sections",
+    collection_name: str = None,
+    query_embedding: List[float] = None
 ) -> List[Document]:
     """
-    Search across all collections in Chroma.
+    Search the unified collection in Chroma.
     
     Args:
         client: Chroma client
@@ -260,50 +551,38 @@ def unified_search(
         query: Search query
         k: Number of results to return
         filter_section: Section to filter by
+        collection_name: Only return chunks from this collection (optional)
+        query_embedding: Precomputed embedding of `query` (optional)
         
     Returns:
         List of Document objects from search results
     """
-    collection_names = client.list_collections()
-    print(f"Searching across {len(collection_names)} collections...")
-
-    all_results = []
-
-    for collection in collection_names:
-        if isinstance(collection, dict):
-            collection_name = collection.get("name")
-        else:
-            collection_name = collection
-        
-        print(f"Searching in collection: {collection_name}")
+    try:
+        collection = client.get_collection(UNIFIED_COLLECTION_NAME)
+    except Exception as e:
+        print(f"No documents to search yet: {str(e)}")
+        return []
 
-        chroma_store = Chroma(
-            client=client,
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=persist_dir
+    print(f"Searching collection: {collection_name or 'all'}")
+    try:
+        if query_embedding is None:
+            query_embedding = embeddings.embed_query(query)
+        # No section filtering for now to maximize results
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=k,
+            where={"collection_name": collection_name} if collection_name else None,
+            include=["documents", "metadatas"]
         )
+    except Exception as e:
+        print(f"Error searching: {str(e)}")
+        return []
 
-        try:
-            # Use similarity_search_with_score to get the scores
-            results = chroma_store.similarity_search_with_score(
-                query,
-                k=k,
-                filter=None  # No filtering for now to maximize results
-            )
-            all_results.extend(results)
-        except Exception as e:
-            print(f"Error searching collection {collection_name}: {str(e)}")
-            continue
-
-    # Sort all results by similarity score (lower is better)
-    all_results.sort(key=lambda x: x[1])
-
-    # Take top k
-    top_results = all_results[:k]
-
-    # Extract just the documents
-    retrieved_docs = [doc for doc, score in top_results]
+    # Results come back ordered by similarity score (lower is better)
+    retrieved_docs = [
+        Document(page_content=document, metadata=metadata or {})
+        for document, metadata in zip(results["documents"][0], results["metadatas"][0])
+    ]
 
-    print(f"Found {len(retrieved_docs)} documents after merging.")
-    return retrieved_docs
\ No newline at end of file
+    print(f"Found {len(retrieved_docs)} documents.")
+    return retrieved_docs